@@ -5,6 +5,16 @@ import matplotlib.pyplot as plt
 from io import StringIO, BytesIO
 from datetime import datetime, date, timedelta
 import base64
+import json
+import re
+import zipfile
+from bisect import bisect_left, bisect_right
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 # App title and configuration
 st.set_page_config(page_title="Lab Assistant Pro", layout="wide")
@@ -29,6 +39,212 @@ if 'plot_data' not in st.session_state:
 if 'daily_tasks' not in st.session_state:
     st.session_state.daily_tasks = pd.DataFrame(columns=['Date', 'Task', 'Priority', 'Status'])
 
+protocol_meta_defaults = {
+    'protocol_title': "Standard Operating Procedure",
+    'protocol_author': "Lab Researcher",
+    'protocol_date': datetime.today().date(),
+    'protocol_version': "1.0",
+    'protocol_description': ""
+}
+for key, value in protocol_meta_defaults.items():
+    if key not in st.session_state:
+        st.session_state[key] = value
+
+# ===== SESSION SNAPSHOTS =====
+# Tables are stored as zstd-compressed Parquet members (left uncompressed in
+# the zip, since Parquet is already compressed) and loaded column-wise on
+# restore; protocol steps and metadata are stored as JSON.
+snapshot_tables = {
+    'experiment_data': ['Experiment', 'Date', 'Component', 'Concentration', 'Volume', 'Notes'],
+    'plot_data': ['x', 'y', 'series'],
+    'daily_tasks': ['Date', 'Task', 'Priority', 'Status']
+}
+protocol_step_keys = ['type', 'description', 'duration', 'notes', 'timestamp']
+
+def build_session_snapshot():
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name in snapshot_tables:
+            table = pa.Table.from_pandas(st.session_state[name], preserve_index=False)
+            sink = pa.BufferOutputStream()
+            pq.write_table(table, sink, compression='zstd')
+            archive.writestr(f"{name}.parquet", sink.getvalue().to_pybytes(),
+                             compress_type=zipfile.ZIP_STORED)
+        
+        metadata = {key: st.session_state[key] for key in protocol_meta_defaults}
+        metadata['protocol_date'] = metadata['protocol_date'].isoformat()
+        protocol = {'metadata': metadata, 'steps': st.session_state.protocol_steps}
+        archive.writestr("protocol.json", json.dumps(protocol, indent=2),
+                         compress_type=zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+def restore_session_snapshot(data):
+    # Read and validate every member first so a bad archive leaves the
+    # current session untouched
+    tables = {}
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        for name, columns in snapshot_tables.items():
+            member = pa.py_buffer(archive.read(name + ".parquet"))
+            tables[name] = pq.read_table(pa.BufferReader(member)).to_pandas()
+            if list(tables[name].columns) != columns:
+                raise ValueError(f"{name} does not have the columns {columns}")
+        
+        protocol = json.loads(archive.read("protocol.json"))
+    
+    if not isinstance(protocol, dict):
+        raise ValueError("protocol.json is malformed")
+    steps = protocol['steps']
+    metadata = protocol['metadata']
+    if not isinstance(steps, list) or not isinstance(metadata, dict):
+        raise ValueError("protocol.json is malformed")
+    for step in steps:
+        if not isinstance(step, dict) or not all(isinstance(step.get(key), str) for key in protocol_step_keys):
+            raise ValueError(f"Protocol steps need the text fields {protocol_step_keys}")
+    
+    metadata = {key: metadata[key] for key in protocol_meta_defaults if key in metadata}
+    if not all(isinstance(value, str) for value in metadata.values()):
+        raise ValueError("Protocol metadata values must be text")
+    if 'protocol_date' in metadata:
+        metadata['protocol_date'] = date.fromisoformat(metadata['protocol_date'])
+    
+    for name, table in tables.items():
+        st.session_state[name] = table
+    st.session_state.protocol_steps = steps
+    for key, value in metadata.items():
+        st.session_state[key] = value
+    st.session_state.pop('log_index', None)
+    st.session_state.pop('snapshot_archive', None)
+
+# ===== EXPERIMENT LOG INDEX =====
+# Inverted index over the text columns plus sorted (key, row) indexes on date
+# and numeric concentration. Rows are only ever appended to experiment_data,
+# so the index is extended from its last indexed row instead of rebuilt.
+indexed_text_columns = ['Experiment', 'Component', 'Notes']
+
+def new_log_index():
+    return {'size': 0, 'tokens': {}, 'date_keys': [], 'date_rows': [], 'conc': {}}
+
+def tokenize(text):
+    return re.findall(r"\w+", str(text).lower())
+
+def extend_sorted(keys, rows, new_keys, new_rows):
+    if len(new_keys) > len(keys):
+        # Bulk load (first build or after a restore): one argsort over everything
+        all_keys = np.concatenate([np.asarray(keys, dtype=new_keys.dtype), new_keys])
+        all_rows = np.concatenate([np.asarray(rows, dtype=new_rows.dtype), new_rows])
+        codes, _ = pd.factorize(all_keys, sort=True)
+        order = np.argsort(codes, kind='stable')
+        keys[:] = all_keys[order].tolist()
+        rows[:] = all_rows[order].tolist()
+        return
+    
+    # Entries are usually logged in date order, so this is an append
+    for key, row in zip(new_keys.tolist(), new_rows.tolist()):
+        position = bisect_right(keys, key)
+        keys.insert(position, key)
+        rows.insert(position, row)
+
+def distinct_value_rows(column, positions):
+    # Yield each non-null distinct value with the row positions holding it
+    codes, values = pd.factorize(column)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+    for code, value in enumerate(values):
+        yield value, positions[order[bounds[code]:bounds[code + 1]]]
+
+def update_log_index():
+    data = st.session_state.experiment_data
+    index = st.session_state.get('log_index')
+    if index is None or index['size'] > len(data):
+        index = new_log_index()
+    
+    start = index['size']
+    if start < len(data):
+        new_entries = data.iloc[start:]
+        positions = np.arange(start, len(data))
+        
+        # Log text repeats a lot (experiment and reagent names), so each
+        # distinct value is parsed once and applied to all rows sharing it
+        for column in indexed_text_columns:
+            for value, rows in distinct_value_rows(new_entries[column], positions):
+                for token in set(tokenize(value)):
+                    index['tokens'].setdefault(token, set()).update(rows.tolist())
+        
+        present = new_entries['Date'].notna().to_numpy()
+        dates = new_entries['Date'][present].astype(str).to_numpy(dtype=object)
+        extend_sorted(index['date_keys'], index['date_rows'], dates, positions[present])
+        
+        codes, distinct = pd.factorize(new_entries['Concentration'])
+        if len(distinct):
+            parts = pd.Series(distinct, dtype=object).astype(str).str.partition(" ")
+            numbers = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)[codes]
+            units = parts[2].to_numpy(dtype=object)[codes]
+            present = (codes >= 0) & ~np.isnan(numbers)
+            for unit in pd.unique(units[present]):
+                selected = present & (units == unit)
+                keys, rows = index['conc'].setdefault(unit, ([], []))
+                extend_sorted(keys, rows, numbers[selected], positions[selected])
+    
+    index['size'] = len(data)
+    st.session_state.log_index = index
+    return index
+
+def search_log_index(index, text="", date_range=None, conc_unit=None, conc_range=None):
+    candidates = [index['tokens'].get(token, set()) for token in tokenize(text)]
+    
+    if date_range:
+        lo = bisect_left(index['date_keys'], date_range[0])
+        hi = bisect_right(index['date_keys'], date_range[1])
+        candidates.append(index['date_rows'][lo:hi])
+    
+    if conc_unit:
+        keys, rows = index['conc'].get(conc_unit, ([], []))
+        lo = bisect_left(keys, conc_range[0])
+        hi = bisect_right(keys, conc_range[1])
+        candidates.append(rows[lo:hi])
+    
+    if not candidates:
+        return None
+    
+    # Intersect starting from the most selective filter
+    candidates.sort(key=len)
+    matches = set(candidates[0])
+    for rows in candidates[1:]:
+        if not matches:
+            break
+        matches.intersection_update(rows)
+    return sorted(matches)
+
+def aggregate_component_usage(rows):
+    columns = ['Component', 'Month', 'Entries', 'Total Volume (mL)']
+    subset = st.session_state.experiment_data
+    if rows is not None:
+        subset = subset.iloc[rows]
+    if subset.empty:
+        return pd.DataFrame(columns=columns)
+    
+    volume = subset['Volume'].astype(str).str.partition(" ")
+    to_ml = {"L": 1e3, "mL": 1.0, "µL": 1e-3}
+    usage = pd.DataFrame({
+        'Component': subset['Component'].values,
+        'Month': subset['Date'].astype(str).str[:7].values,
+        'Volume': (pd.to_numeric(volume[0], errors='coerce') * volume[2].map(to_ml)).values
+    })
+    usage = usage.groupby(['Component', 'Month']).agg(
+        Entries=('Volume', 'size'), Total=('Volume', 'sum')
+    ).reset_index()
+    usage.columns = columns
+    return usage
+
+# Snapshots are applied before any widget is created so that keyed widgets
+# (protocol metadata) pick up the restored values
+if 'pending_snapshot' in st.session_state:
+    try:
+        restore_session_snapshot(st.session_state.pop('pending_snapshot'))
+        st.session_state.snapshot_restored = True
+    except (zipfile.BadZipFile, KeyError, pa.ArrowInvalid, ValueError) as e:
+        st.session_state.snapshot_error = f"Could not restore snapshot: {e}"
+
 # Create tabs for different functionalities
 tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
     "Dilution Calculator", 
@@ -349,6 +565,46 @@ with tab5:
     
     st.subheader("Current Experiment Data")
     st.dataframe(st.session_state.experiment_data)
+    
+    # Indexed search over the log
+    st.subheader("Search Experiment Log")
+    log_index = update_log_index()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        search_text = st.text_input("Search Experiment, Component and Notes", key="log_search_text")
+        date_range = None
+        if st.checkbox("Filter by date", key="log_filter_date"):
+            dates = st.date_input("Date range", (date.today() - timedelta(days=30), date.today()),
+                                  key="log_date_range")
+            if len(dates) == 2:
+                date_range = (dates[0].strftime("%Y-%m-%d"), dates[1].strftime("%Y-%m-%d"))
+    
+    with col2:
+        search_unit = None
+        conc_range = None
+        if st.checkbox("Filter by concentration", key="log_filter_conc"):
+            search_unit = st.selectbox("Concentration unit", conc_units, key="log_conc_unit")
+            conc_min = st.number_input("Minimum", min_value=0.0, value=0.0, key="log_conc_min")
+            conc_max = st.number_input("Maximum", min_value=0.0, value=1000.0, key="log_conc_max")
+            conc_range = (conc_min, conc_max)
+    
+    # Kept in session state for the Data Export tab; None means no filter is set
+    st.session_state.log_matches = search_log_index(
+        log_index, search_text, date_range, search_unit, conc_range
+    )
+    matching_rows = st.session_state.log_matches
+    
+    if matching_rows is None:
+        st.caption("Enter a search term or set a filter to search the log.")
+    elif matching_rows:
+        st.caption(f"{len(matching_rows)} matching entries")
+        st.dataframe(st.session_state.experiment_data.iloc[matching_rows])
+    else:
+        st.info("No entries match the current search.")
+    
+    if st.checkbox("Show usage per component per month", key="log_show_usage"):
+        st.dataframe(aggregate_component_usage(matching_rows))
 
 # ===== TAB 6: PROTOCOL GENERATOR =====
 with tab6:
@@ -356,11 +612,11 @@ with tab6:
     
     # Protocol metadata
     with st.expander("Protocol Metadata"):
-        protocol_title = st.text_input("Protocol Title", "Standard Operating Procedure")
-        protocol_author = st.text_input("Author", "Lab Researcher")
-        protocol_date = st.date_input("Date", datetime.today())
-        protocol_version = st.text_input("Version", "1.0")
-        protocol_description = st.text_area("Brief Description")
+        protocol_title = st.text_input("Protocol Title", key="protocol_title")
+        protocol_author = st.text_input("Author", key="protocol_author")
+        protocol_date = st.date_input("Date", key="protocol_date")
+        protocol_version = st.text_input("Version", key="protocol_version")
+        protocol_description = st.text_area("Brief Description", key="protocol_description")
     
     # Protocol steps management
     st.subheader("Protocol Steps")
@@ -616,14 +872,20 @@ with tab8:
     
     if not st.session_state.experiment_data.empty:
         st.subheader("Experiment Data")
-        st.dataframe(st.session_state.experiment_data)
+        export_data = st.session_state.experiment_data
+        log_matches = st.session_state.get('log_matches')
+        if log_matches is not None and st.checkbox("Only entries matching the Experiment Log search",
+                                                   key="export_filtered"):
+            export_data = export_data.iloc[log_matches]
+            st.caption(f"{len(export_data)} of {len(st.session_state.experiment_data)} entries selected")
+        st.dataframe(export_data)
         
         # Export options
         export_format = st.selectbox("Export Format", 
                                    ["CSV", "Excel", "JSON", "Markdown"])
         
         if export_format == "CSV":
-            csv = st.session_state.experiment_data.to_csv(index=False)
+            csv = export_data.to_csv(index=False)
             st.download_button(
                 "Download CSV",
                 data=csv,
@@ -632,7 +894,7 @@ with tab8:
             )
         elif export_format == "Excel":
             excel_buffer = StringIO()
-            st.session_state.experiment_data.to_excel(excel_buffer, index=False)
+            export_data.to_excel(excel_buffer, index=False)
             st.download_button(
                 "Download Excel",
                 data=excel_buffer.getvalue(),
@@ -640,15 +902,15 @@ with tab8:
                 mime="application/vnd.ms-excel"
             )
         elif export_format == "JSON":
-            json = st.session_state.experiment_data.to_json(indent=2)
+            json_data = export_data.to_json(indent=2)
             st.download_button(
                 "Download JSON",
-                data=json,
+                data=json_data,
                 file_name="experiment_data.json",
                 mime="application/json"
             )
         elif export_format == "Markdown":
-            md = st.session_state.experiment_data.to_markdown(index=False)
+            md = export_data.to_markdown(index=False)
             st.download_button(
                 "Download Markdown",
                 data=md,
@@ -659,10 +921,44 @@ with tab8:
         # Print functionality
         if st.button("Print Data"):
             st.write("```python")
-            st.write(st.session_state.experiment_data.to_string(index=False))
+            st.write(export_data.to_string(index=False))
             st.write("```")
     else:
         st.warning("No experiment data available to export")
+    
+    # Whole-session snapshot
+    st.subheader("Session Snapshot")
+    if st.session_state.pop('snapshot_restored', False):
+        st.success("Session restored from snapshot!")
+    if 'snapshot_error' in st.session_state:
+        st.error(st.session_state.pop('snapshot_error'))
+    
+    if pa is None:
+        st.warning("Session snapshots require pyarrow. Install it with `pip install pyarrow`.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            # Built on request rather than on every rerun
+            if st.button("Prepare Session Snapshot"):
+                st.session_state.snapshot_archive = build_session_snapshot()
+                st.session_state.snapshot_time = datetime.now()
+            
+            if 'snapshot_archive' in st.session_state:
+                snapshot_time = st.session_state.snapshot_time
+                st.download_button(
+                    "Download Session Snapshot",
+                    data=st.session_state.snapshot_archive,
+                    file_name=f"lab_session_{snapshot_time.strftime('%Y%m%d_%H%M')}.zip",
+                    mime="application/zip"
+                )
+                st.caption(f"Prepared {snapshot_time.strftime('%Y-%m-%d %H:%M')}. "
+                           "Prepare again to include later changes.")
+        
+        with col2:
+            snapshot_file = st.file_uploader("Restore from snapshot", type=["zip"])
+            if snapshot_file is not None and st.button("Restore Session"):
+                st.session_state.pending_snapshot = snapshot_file.getvalue()
+                st.rerun()
 
 # Sidebar with references
 st.sidebar.header("Reference Tables")